@@ -0,0 +1,367 @@
+# Markdown -> Word conversion. Kept out of app.py so Streamlit imports it once
+# per process instead of re-executing it on every script rerun.
+import hashlib
+import re
+from functools import lru_cache
+from io import BytesIO
+from pathlib import Path
+from xml.sax.saxutils import escape
+import docx
+from docx import Document
+from docx.shared import Pt, RGBColor
+from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
+from docx.enum.style import WD_STYLE_TYPE
+from docx.oxml.ns import nsdecls
+from docx.oxml import OxmlElement, parse_xml
+
+# Part of the on-disk cache key, so cached documents from older code are never served
+CONVERTER_VERSION = (docx.__version__, hashlib.sha256(Path(__file__).read_bytes()).hexdigest())
+
+# Helper functions
+# Single-line black border on every edge, parsed per table from one string
+_TABLE_BORDERS_XML = f'<w:tblBorders {nsdecls("w")}>' + ''.join(
+    f'<w:{b} w:val="single" w:sz="4" w:space="0" w:color="000000"/>'
+    for b in ('top', 'left', 'bottom', 'right', 'insideH', 'insideV')
+) + '</w:tblBorders>'
+
+def add_table_border(table):
+    tbl = table._element
+    tblPr = tbl.tblPr
+    if tblPr is None:
+        tblPr = OxmlElement('w:tblPr')
+        tbl.insert(0, tblPr)
+    tblPr.append(parse_xml(_TABLE_BORDERS_XML))
+
+def fill_table(table, headers, rows, size):
+    # Build every row as one XML string and parse it once, rather than going
+    # through cell.text and the run API for each cell
+    tbl = table._tbl
+    grid = tbl.tblGrid.gridCol_lst
+    tc_open = f'<w:tc><w:tcPr><w:tcW w:type="dxa" w:w="{grid[0].w.twips if grid else 0}"/></w:tcPr><w:p>'
+    header_rpr = f'<w:rPr><w:b/><w:sz w:val="{size*2}"/></w:rPr>'
+    cols = len(headers)
+    xml = [f'<w:tbl {nsdecls("w")}><w:tr>']
+    for h in headers:
+        xml.append(f'{tc_open}<w:r>{header_rpr}<w:t>{escape(h)}</w:t></w:r></w:p></w:tc>')
+    xml.append('</w:tr>')
+    for row in rows:
+        xml.append('<w:tr>')
+        for ci in range(cols):
+            if ci < len(row) and row[ci]:
+                xml.append(f'{tc_open}<w:r><w:t>{escape(row[ci])}</w:t></w:r></w:p></w:tc>')
+            else:
+                xml.append(f'{tc_open}</w:p></w:tc>')
+        xml.append('</w:tr>')
+    xml.append('</w:tbl>')
+    tbl.extend(list(parse_xml(''.join(xml))))
+
+# Delimiter row under a table header: only pipes, colons, dashes and spaces,
+# with at least one pipe and one dash (|---|, |:-:|, - | -), so a --- rule is not one
+_TABLE_SEP_RE = re.compile(r'(?=[^|]*\|)[\s|:]*-[\s|:-]*$')
+
+def _split_row(line):
+    # Only the outer pipes are dropped, so empty cells keep their column
+    return [cell.strip() for cell in line.strip().removeprefix('|').removesuffix('|').split('|')]
+
+def is_table_start(lines, i):
+    # The delimiter row must also have one cell per header cell
+    return (i+1 < len(lines) and _TABLE_SEP_RE.match(lines[i+1]) is not None
+            and len(_split_row(lines[i+1])) == len(_split_row(lines[i])))
+
+def parse_table(lines, start_idx):
+    table_lines = []
+    idx = start_idx
+    n = len(lines)
+    while idx < n and '|' in lines[idx]:
+        table_lines.append(lines[idx])
+        idx += 1
+    if len(table_lines) < 2:
+        return None, start_idx
+    headers = _split_row(table_lines[0])
+    rows = [_split_row(line) for line in table_lines[2:]]
+    return {'headers': headers, 'rows': rows}, idx
+
+_LATEX_REPL = {
+    r'\text{': '', r'\mathrm{': '', r'\mathbf{': '',
+    r'\hat{': '', r'\bar{': '', r'\tilde{': '',
+    r'\boxed{': '', r'\left': '', r'\right': '',
+    r'\begin{aligned}': '', r'\end{aligned}': '',
+    r'\,': ' ', r'\quad': '  ',
+    r'\alpha': 'α', r'\beta': 'β', r'\gamma': 'γ', r'\delta': 'δ',
+    r'\epsilon': 'ε', r'\theta': 'θ', r'\lambda': 'λ', r'\mu': 'μ',
+    r'\nu': 'ν', r'\xi': 'ξ', r'\pi': 'π', r'\rho': 'ρ', r'\sigma': 'σ',
+    r'\tau': 'τ', r'\phi': 'φ', r'\chi': 'χ', r'\psi': 'ψ', r'\omega': 'ω',
+    r'\Gamma': 'Γ', r'\Delta': 'Δ', r'\Theta': 'Θ', r'\Lambda': 'Λ',
+    r'\Pi': 'Π', r'\Sigma': 'Σ', r'\Phi': 'Φ', r'\Psi': 'Ψ', r'\Omega': 'Ω',
+    r'\times': '×', r'\div': '÷', r'\pm': '±', r'\cdot': '·',
+    r'\leq': '≤', r'\geq': '≥', r'\neq': '≠', r'\approx': '≈', r'\equiv': '≡',
+    r'\rightarrow': '→', r'\to': '→', r'\leftarrow': '←', r'\leftrightarrow': '↔',
+    r'\in': '∈', r'\infty': '∞', r'\int': '∫', r'\sum': '∑', r'\partial': '∂',
+    r'\hbar': 'ℏ', r'\sqrt': '√',
+}
+# Longest-first so \rightarrow wins over \right and \infty over \in
+_LATEX_RE = re.compile('|'.join(re.escape(k) for k in sorted(_LATEX_REPL, key=len, reverse=True)))
+_FRAC_RE = re.compile(r'\\frac\{([^}]+)\}\{([^}]+)\}')
+_SUP_RE = re.compile(r'\^\{([^}]+)\}')
+_SUB_RE = re.compile(r'_\{([^}]+)\}')
+_CMD_RE = re.compile(r'\\[a-zA-Z]+')
+_SUP_MAP = str.maketrans('0123456789+-', '⁰¹²³⁴⁵⁶⁷⁸⁹⁺⁻')
+_SUB_MAP = str.maketrans('0123456789sn', '₀₁₂₃₄₅₆₇₈₉ₛₙ')
+
+def _sup(m):
+    return m.group(1).translate(_SUP_MAP)
+
+def _sub(m):
+    return m.group(1).translate(_SUB_MAP)
+
+# Pure over its argument; the same symbols and formulas recur across a document
+@lru_cache(maxsize=4096)
+def convert_latex_to_unicode(latex_text):
+    # Nothing below touches plain math like "x + y" (no backslash or brace)
+    if '\\' not in latex_text and '{' not in latex_text and '}' not in latex_text:
+        return latex_text.strip()
+    result = _LATEX_RE.sub(lambda m: _LATEX_REPL[m.group(0)], latex_text)
+    result = _FRAC_RE.sub(r'(\1)/(\2)', result)
+    result = _SUP_RE.sub(_sup, result)
+    result = _SUB_RE.sub(_sub, result)
+    result = result.replace('{', '').replace('}', '')
+    result = _CMD_RE.sub('', result)
+    result = result.replace('\\', '')
+    return result.strip()
+
+# Inline delimiters: opener -> (closer, kind). At each position the two-char
+# openers win over the one-char ones, so the order is display math, inline
+# math, bold, italic (single * not touching another *), code
+_DELIMS = {
+    '\\[': ('\\]', 'math_display'),
+    '\\(': ('\\)', 'math_inline'),
+    '**': ('**', 'bold'),
+    '*': ('*', 'italic'),
+    '`': ('`', 'code'),
+}
+_SPECIAL_RE = re.compile(r'[*`\\]')
+
+# Character styles: kind -> (font name, color, bold, italic, size offset)
+_RUN_STYLES = {
+    'body': (None, None, None, None, 0),
+    'math_display': ('Cambria Math', RGBColor(0,120,0), True, None, 1),
+    'math_inline': ('Cambria Math', RGBColor(0,120,0), True, None, 0),
+    'bold': (None, None, True, None, 0),
+    'italic': (None, None, None, True, 0),
+    'code': ('Courier New', RGBColor(220,50,50), None, None, -1),
+}
+
+# styles caches style ids for one document: (kind, size) for our character
+# styles, the style name for built-in paragraph and table styles
+def run_style(para, kind, size, styles):
+    style = styles.get((kind, size))
+    if style is None:
+        name, color, bold, italic, offset = _RUN_STYLES[kind]
+        style = para.part.styles.add_style(f"Md {kind} {size}", WD_STYLE_TYPE.CHARACTER)
+        if name:
+            style.font.name = name
+        style.font.size = Pt(size+offset)
+        if color:
+            style.font.color.rgb = color
+        if bold:
+            style.font.bold = True
+        if italic:
+            style.font.italic = True
+        style = styles[(kind, size)] = style.style_id
+    return style
+
+def _italic_close(text, start):
+    # First * that isn't followed by another *
+    j = text.find('*', start)
+    while j >= 0 and text.startswith('*', j+1):
+        j = text.find('*', j+1)
+    return j
+
+@lru_cache(maxsize=4096)
+def tokenize_inline(text):
+    m = _SPECIAL_RE.search(text)
+    if not m:
+        return (('body', text),)
+    tokens = []
+    pos = 0
+    # A closer that is absent from some position on is absent from every later
+    # one too; remembering that keeps lines of unclosed openers linear
+    missing = set()
+    
+    while m:
+        i = m.start()
+        opener = text[i:i+2] if text[i:i+2] in _DELIMS else text[i]
+        closer, kind = _DELIMS.get(opener, (None, None))
+        if opener == '*' and i and text[i-1] == '*':
+            closer = None
+        end = -1
+        if closer and closer not in missing:
+            start = i + len(opener)
+            end = _italic_close(text, start) if opener == '*' else text.find(closer, start)
+            if end < 0:
+                missing.add(closer)
+        if end < 0:
+            m = _SPECIAL_RE.search(text, i+1)
+            continue
+        if i > pos:
+            tokens.append(('body', text[pos:i]))
+        content = text[i+len(opener):end]
+        if kind == 'math_display':
+            content = convert_latex_to_unicode(content.strip())
+        elif kind == 'math_inline':
+            content = ' '+convert_latex_to_unicode(content.strip())+' '
+        tokens.append((kind, content))
+        pos = end + len(closer)
+        m = _SPECIAL_RE.search(text, pos)
+    
+    if pos < len(text):
+        tokens.append(('body', text[pos:]))
+    return tuple(tokens)
+
+def _run_xml(sid, content, color):
+    text = escape(content).replace('\t', '</w:t><w:tab/><w:t xml:space="preserve">')
+    color = f'<w:color w:val="{color}"/>' if color else ''
+    return f'<w:r><w:rPr><w:rStyle w:val="{sid}"/>{color}</w:rPr><w:t xml:space="preserve">{text}</w:t></w:r>'
+
+def format_text(text, para, size, styles, color=None):
+    # Parse all runs of the paragraph at once instead of add_run + style
+    # assignment per run, which looks up the default style every time.
+    # color applies to runs whose style doesn't set one (math, code do)
+    color = str(color) if color else None
+    xml = [f'<w:p {nsdecls("w")}>']
+    for kind, content in tokenize_inline(text):
+        run_color = None if _RUN_STYLES[kind][1] else color
+        xml.append(_run_xml(run_style(para, kind, size, styles), content, run_color))
+    xml.append('</w:p>')
+    para._p.extend(list(parse_xml(''.join(xml))))
+
+# Block-level line kinds. Tables and fenced code span several lines and are
+# handled in the convert_to_docx loop itself.
+_LINE_RE = re.compile(
+    r'(?P<fence>\s*```)'
+    r'|(?P<hr>\s*---\s*$)'
+    r'|(?P<heading>#{1,3} )'
+    r'|\s*(?P<ul>[-*] )(?=\s*\S)'
+    r'|\s*(?P<ol>\d+\.\s)(?=\s*\S)'
+    r'|\s*(?P<quote>>)'
+)
+# Markdown line endings only; str.splitlines() would also break on U+2028,
+# U+2029, NEL and \x1c-\x1e, which can sit inside pasted text
+_NEWLINE_RE = re.compile(r'\r\n?|\n')
+_OL_RE = re.compile(r'^\d+\.\s')
+_FENCE_RE = re.compile(r'\s*```')
+_HR_COLOR = RGBColor(200,200,200)
+# Heading level -> (font size offset, color)
+_HEADINGS = {
+    1: (2, RGBColor(0,51,102)),
+    2: (1, RGBColor(51,102,153)),
+    3: (0, RGBColor(102,153,204)),
+}
+
+def style_id(doc, name, styles):
+    # Assigning a style by name makes python-docx scan every style in the
+    # document, twice; resolve each name once and set the id directly
+    sid = styles.get(name)
+    if sid is None:
+        sid = styles[name] = doc.styles[name].style_id
+    return sid
+
+def styled_para(doc, name, styles):
+    p = doc.add_paragraph()
+    p._p.style = style_id(doc, name, styles)
+    return p
+
+def _add_hr(doc, line, size, colors, styles):
+    p = doc.add_paragraph('─'*80)
+    for r in p.runs:
+        r.font.color.rgb = _HR_COLOR
+
+def _add_heading(doc, line, size, colors, styles):
+    level = line.index(' ')
+    offset, color = _HEADINGS[level]
+    p = styled_para(doc, f'Heading {level}', styles)
+    format_text(line[level+1:], p, size+offset, styles, color if colors else None)
+
+def _add_bullet(doc, line, size, colors, styles):
+    p = styled_para(doc, 'List Bullet', styles)
+    format_text(line.strip()[2:], p, size, styles)
+
+def _add_numbered(doc, line, size, colors, styles):
+    p = styled_para(doc, 'List Number', styles)
+    format_text(_OL_RE.sub('', line.strip()), p, size, styles)
+
+def _add_quote(doc, line, size, colors, styles):
+    p = styled_para(doc, 'Intense Quote', styles)
+    format_text(line.strip()[1:].strip(), p, size, styles)
+
+def _add_para(doc, line, size, colors, styles):
+    if line.strip():
+        p = doc.add_paragraph()
+        format_text(line, p, size, styles)
+
+_BLOCK_HANDLERS = {
+    'hr': _add_hr, 'heading': _add_heading,
+    'ul': _add_bullet, 'ol': _add_numbered, 'quote': _add_quote, 'para': _add_para,
+}
+
+# python-docx's bundled default template, read once when this module is imported
+_TEMPLATE = (Path(docx.__file__).parent / 'templates' / 'default.docx').read_bytes()
+
+def convert_to_docx(md_text, title, size, colors):
+    doc = Document(BytesIO(_TEMPLATE))
+    styles = {}
+    
+    tp = doc.add_heading(title, 0)
+    tp.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
+    
+    code_size = Pt(size-1)
+    lines = _NEWLINE_RE.split(md_text)
+    # As with splitlines(), a final line ending doesn't start another line
+    if not lines[-1]:
+        lines.pop()
+    n = len(lines)
+    i = 0
+    
+    while i < n:
+        line = lines[i]
+        m = _LINE_RE.match(line)
+        kind = m.lastgroup if m else 'para'
+        
+        if kind == 'fence':
+            # Take the whole block up to the closing fence, or the end of the text
+            j = next((j for j in range(i+1, n) if _FENCE_RE.match(lines[j])), n)
+            p = styled_para(doc, 'Intense Quote', styles)
+            if j > i+1:
+                r = p.add_run('\n'.join(lines[i+1:j]))
+                r.font.name = 'Courier New'
+                r.font.size = code_size
+            i = j + 1
+            continue
+        
+        # Display math left open on this line: fold in lines up to the closing \],
+        # again if that line opens another block
+        start = i
+        while line.rfind('\\[') > line.rfind('\\]'):
+            j = next((j for j in range(i+1, n) if '\\]' in lines[j]), None)
+            if j is None:
+                break
+            i = j
+            line = ' '.join(lines[start:i+1])
+        
+        if '|' in line and is_table_start(lines, i):
+            td, ei = parse_table(lines, i)
+            if td:
+                t = doc.add_table(rows=0, cols=len(td['headers']))
+                t._tbl.tblPr.style = style_id(doc, 'Light Grid Accent 1', styles)
+                add_table_border(t)
+                fill_table(t, td['headers'], td['rows'], size)
+                i = ei
+                continue
+        
+        _BLOCK_HANDLERS[kind](doc, line, size, colors, styles)
+        i += 1
+    
+    bio = BytesIO()
+    doc.save(bio)
+    bio.seek(0)
+    return bio.getvalue()